@@ -1,28 +1,55 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
 import json
 import logging
+import logging.handlers
 import os
+import re
+import sqlite3
 import sys
-import traceback
+import threading
 import time
+from collections import OrderedDict
+from typing import Optional
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
+from telegram.ext import Application, ChatMemberHandler, CommandHandler, MessageHandler, ContextTypes, filters
 from telegram.error import TelegramError
+from telegram.request import HTTPXRequest
+
+# orjson необязателен: без него используется стандартный модуль json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# pyahocorasick необязателен: без него используется регулярное выражение
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # Настройка расширенного логирования
+# Уровень задается переменной окружения LOG_LEVEL (например, WARNING в продакшене)
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Файл лога ротируется по 10 МБ (хранится до 5 старых файлов)
+# Записи в файл буферизуются и сбрасываются пачками по 512 записей или сразу при ошибке
+file_handler = logging.handlers.RotatingFileHandler(
+    "bot_log.txt", maxBytes=10_000_000, backupCount=5, encoding='utf-8', delay=True
+)
+file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
 logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
+    format=LOG_FORMAT,
+    level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
     handlers=[
-        logging.FileHandler("bot_log.txt", encoding='utf-8'),
+        logging.handlers.MemoryHandler(capacity=512, flushLevel=logging.ERROR, target=file_handler),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
-# Директория для хранения файлов со стоп-словами для разных групп
+# Директория для хранения базы стоп-слов (и старых JSON-файлов стоп-слов групп)
 STOPWORDS_DIR = 'stopwords'
 
 # Создаем директорию, если она не существует
@@ -31,48 +58,241 @@ if not os.path.exists(STOPWORDS_DIR):
     logger.info(f"Создана директория {STOPWORDS_DIR}")
 
 # Кэш для хранения последних обработанных сообщений, чтобы избежать повторной обработки
-processed_messages = set()
+# (FIFO: при переполнении удаляется только самая старая запись)
+processed_messages: OrderedDict[tuple[int, int], None] = OrderedDict()
 # Максимальный размер кэша
 MAX_CACHE_SIZE = 1000
 
-# Функция для получения пути к файлу стоп-слов для конкретной группы
-def get_stopwords_file(chat_id):
-    return os.path.join(STOPWORDS_DIR, f'stopwords_{chat_id}.json')
+# Сообщения старше этого возраста (в секундах) не проверяются
+MAX_MESSAGE_AGE = 30
+
+# Задержка перед удалением сообщения со стоп-словом (в секундах), 0 - без задержки
+DELETE_DELAY = float(os.environ.get('DELETE_DELAY', '0.5'))
+
+# Типы обновлений, которые бот получает от Telegram
+ALLOWED_UPDATES = ["message", "edited_message", "channel_post", "edited_channel_post", "my_chat_member"]
+# Внешний адрес для режима webhook (например, https://example.com), без него используется long polling
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')
+# Локальный порт, на котором бот принимает webhook-запросы
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', '8443'))
+
+# Размер пула HTTP-соединений к Bot API
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '64'))
+# Версия HTTP для запросов к Bot API ('2' требует пакет httpx[http2])
+HTTP_VERSION = os.environ.get('HTTP_VERSION', '1.1')
+
+# База данных SQLite со стоп-словами всех групп
+DB_PATH = os.path.join(STOPWORDS_DIR, 'stopwords.db')
+# Соединение с базой создается при первом обращении, доступ к нему из потоков защищен блокировкой
+_db: Optional[sqlite3.Connection] = None
+_db_lock = threading.Lock()
+
+# Кэш стоп-слов в памяти: chat_id -> frozenset стоп-слов
+# Бот - единственный, кто изменяет базу, поэтому кэш обновляется вместе с ней
+_STOPWORDS_CACHE: dict[int, frozenset[str]] = {}
+# Кэш средств поиска: chat_id -> (frozenset, по которому они построены, длина самого короткого
+# и самого длинного стоп-слова, автомат Ахо-Корасик или регулярное выражение)
+_MATCHER_CACHE: dict[int, tuple[frozenset[str], int, int, object]] = {}
+
+# Статусы участника чата, дающие права администратора
+_ADMIN_STATUSES = frozenset(('creator', 'administrator'))
+
+# Кэш прав бота: chat_id -> (время проверки, есть ли права, сообщение)
+_PERMS_CACHE: dict[int, tuple[float, bool, str]] = {}
+# Время жизни записи в кэше прав бота (в секундах)
+PERMS_CACHE_TTL = 60
+
+# Время последнего сообщения об ошибке: chat_id -> время отправки
+_error_reply_times: dict[int, float] = {}
+# Минимальный интервал между сообщениями об ошибке в одном чате (в секундах)
+ERROR_REPLY_INTERVAL = 60
 
-# Функция для загрузки стоп-слов из файла для конкретной группы
+# Функция для чтения старого JSON-файла стоп-слов (используется при переносе в базу)
+def read_stopwords_file(file_path):
+    if orjson is not None:
+        with open(file_path, 'rb') as file:
+            return orjson.loads(file.read())
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+# Функция для переноса стоп-слов из файлов stopwords_<chat_id>.json в базу
+# Перенесенные файлы переименовываются в *.json.migrated, поврежденные - в *.json.invalid
+def migrate_stopwords_files(conn):
+    for file_name in sorted(os.listdir(STOPWORDS_DIR)):
+        match = re.fullmatch(r'stopwords_(-?\d+)\.json', file_name)
+        if match is None:
+            continue
+        
+        chat_id = int(match.group(1))
+        file_path = os.path.join(STOPWORDS_DIR, file_name)
+        try:
+            words = read_stopwords_file(file_path).get('stopwords', [])
+            if not isinstance(words, list) or not all(isinstance(word, str) for word in words):
+                raise ValueError("ожидается список строк в поле 'stopwords'")
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO stopwords (chat_id, word) VALUES (?, ?)",
+                    [(chat_id, word.lower()) for word in words]
+                )
+        except Exception as e:
+            logger.exception("Ошибка при переносе стоп-слов для чата %s из файла %s: %s", chat_id, file_path, e)
+            try:
+                os.replace(file_path, f'{file_path}.invalid')
+            except OSError as rename_error:
+                logger.error("Не удалось переименовать файл %s: %s", file_path, rename_error)
+            continue
+        
+        logger.info(f"Стоп-слова для чата {chat_id} перенесены из файла {file_path} в базу")
+        # Слова уже в базе, а повторный перенос безопасен благодаря INSERT OR IGNORE
+        try:
+            os.replace(file_path, f'{file_path}.migrated')
+        except OSError as rename_error:
+            logger.error("Не удалось переименовать файл %s: %s", file_path, rename_error)
+
+# Функция для получения соединения с базой (вызывается под _db_lock)
+def get_db():
+    global _db
+    if _db is None:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        try:
+            # WAL: чтение не блокируется записью, один fsync на транзакцию
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stopwords ("
+                "chat_id INTEGER NOT NULL, "
+                "word TEXT NOT NULL, "
+                "PRIMARY KEY (chat_id, word)"
+                ") WITHOUT ROWID"
+            )
+            migrate_stopwords_files(conn)
+        except BaseException:
+            # Не оставляем открытым соединение, которое не попало в _db
+            conn.close()
+            raise
+        logger.info(f"База стоп-слов открыта: {os.path.abspath(DB_PATH)}")
+        _db = conn
+    return _db
+
+# Функция для выполнения запроса к базе в отдельной транзакции (выполняется в отдельном потоке)
+def execute_db(query, params=()):
+    with _db_lock:
+        conn = get_db()
+        with conn:
+            return conn.execute(query, params).fetchall()
+
+# Функция для закрытия соединения с базой при завершении
+async def post_shutdown(application: Application):
+    global _db
+    with _db_lock:
+        if _db is not None:
+            _db.close()
+            _db = None
+
+# Функция для загрузки стоп-слов конкретной группы, возвращает None при ошибке
+# Результат кэшируется в памяти, к базе обращаемся только при первой загрузке
 async def load_stopwords(chat_id):
-    file_path = get_stopwords_file(chat_id)
-    logger.info(f"Загрузка стоп-слов для чата {chat_id} из файла {file_path}")
+    cached = _STOPWORDS_CACHE.get(chat_id)
+    if cached is not None:
+        return cached
     
     try:
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                stopwords = data.get('stopwords', [])
-                logger.info(f"Загружены стоп-слова для чата {chat_id}: {stopwords}")
-                return stopwords
-        else:
-            # Если файл не существует, создаем его с пустым списком
-            logger.info(f"Файл стоп-слов для чата {chat_id} не существует, создаем новый")
-            await save_stopwords(chat_id, [])
-            return []
+        logger.debug("Загрузка стоп-слов для чата %s из базы", chat_id)
+        rows = await asyncio.to_thread(
+            execute_db, "SELECT word FROM stopwords WHERE chat_id = ?", (chat_id,)
+        )
+        stopwords = frozenset(row[0] for row in rows)
+        logger.debug("Загружены стоп-слова для чата %s: %s", chat_id, stopwords)
+        # Пока шел запрос, стоп-слова могли быть изменены командой
+        return _STOPWORDS_CACHE.setdefault(chat_id, stopwords)
     except Exception as e:
-        logger.error(f"Ошибка при загрузке стоп-слов для чата {chat_id}: {e}")
-        logger.error(traceback.format_exc())
-        return []
+        logger.exception("Ошибка при загрузке стоп-слов для чата %s: %s", chat_id, e)
+        return None
 
-# Функция для сохранения стоп-слов в файл для конкретной группы
-async def save_stopwords(chat_id, stopwords):
-    file_path = get_stopwords_file(chat_id)
-    logger.info(f"Сохранение стоп-слов для чата {chat_id} в файл {file_path}: {stopwords}")
+# Функция для добавления стоп-слова конкретной группы, возвращает True при успехе
+async def add_stopword(chat_id, word):
+    # Без успешной загрузки нельзя обновить кэш, не потеряв остальные стоп-слова
+    stopwords = await load_stopwords(chat_id)
+    if stopwords is None:
+        return False
+    logger.info("Добавление стоп-слова '%s' для чата %s", word, chat_id)
     
     try:
-        with open(file_path, 'w', encoding='utf-8') as file:
-            json.dump({'stopwords': stopwords}, file, ensure_ascii=False, indent=4)
-        logger.info(f"Стоп-слова для чата {chat_id} успешно сохранены")
+        await asyncio.to_thread(
+            execute_db, "INSERT OR IGNORE INTO stopwords (chat_id, word) VALUES (?, ?)", (chat_id, word)
+        )
     except Exception as e:
-        logger.error(f"Ошибка при сохранении стоп-слов для чата {chat_id}: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Ошибка при добавлении стоп-слова для чата %s: %s", chat_id, e)
+        return False
+    
+    _STOPWORDS_CACHE[chat_id] = _STOPWORDS_CACHE.get(chat_id, stopwords) | {word}
+    return True
+
+# Функция для удаления стоп-слова конкретной группы, возвращает True при успехе
+async def remove_stopword(chat_id, word):
+    # Без успешной загрузки нельзя обновить кэш, не потеряв остальные стоп-слова
+    stopwords = await load_stopwords(chat_id)
+    if stopwords is None:
+        return False
+    logger.info("Удаление стоп-слова '%s' для чата %s", word, chat_id)
+    
+    try:
+        await asyncio.to_thread(
+            execute_db, "DELETE FROM stopwords WHERE chat_id = ? AND word = ?", (chat_id, word)
+        )
+    except Exception as e:
+        logger.exception("Ошибка при удалении стоп-слова для чата %s: %s", chat_id, e)
+        return False
+    
+    _STOPWORDS_CACHE[chat_id] = _STOPWORDS_CACHE.get(chat_id, stopwords) - {word}
+    return True
+
+# Функция для получения средств поиска для текущей версии стоп-слов чата
+def get_matcher(chat_id, stopwords):
+    cached = _MATCHER_CACHE.get(chat_id)
+    if cached is not None and cached[0] is stopwords:
+        return cached[1:]
+    
+    min_word_len = min(map(len, stopwords), default=0)
+    max_word_len = max(map(len, stopwords), default=0)
+    if ahocorasick is not None:
+        matcher = ahocorasick.Automaton()
+        for word in stopwords:
+            matcher.add_word(word, word)
+        matcher.make_automaton()
+    else:
+        # Более длинные слова идут первыми, чтобы в лог попадало самое полное совпадение
+        words = sorted(stopwords, key=len, reverse=True)
+        matcher = re.compile('|'.join(map(re.escape, words)), re.IGNORECASE)
+    _MATCHER_CACHE[chat_id] = (stopwords, min_word_len, max_word_len, matcher)
+    return min_word_len, max_word_len, matcher
+
+# Функция для поиска первого стоп-слова в тексте, возвращает слово или None
+# Оба способа поиска возвращают самое левое совпадение, а из начинающихся там - самое длинное
+# Стоп-слова в кэше уже приведены к нижнему регистру
+def find_stopword(chat_id, stopwords, text):
+    if not stopwords:
+        return None
+    
+    min_word_len, max_word_len, matcher = get_matcher(chat_id, stopwords)
+    # Сообщение короче любого стоп-слова не может его содержать
+    if len(text) < min_word_len:
+        return None
+    
+    if isinstance(matcher, re.Pattern):
+        match = matcher.search(text)
+        return match.group(0).lower() if match is not None else None
+    
+    # Автомат выдает совпадения в порядке их окончания, поэтому ищем самое левое начало
+    best_start, best_word = None, None
+    for end_index, word in matcher.iter(text.lower()):
+        # Совпадения дальше не могут начинаться левее уже найденного
+        if best_start is not None and end_index - max_word_len + 1 > best_start:
+            break
+        start = end_index - len(word) + 1
+        if best_start is None or start < best_start or (start == best_start and len(word) > len(best_word)):
+            best_start, best_word = start, word
+    return best_word
 
 # Функция для проверки, является ли пользователь администратором группы
 async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -81,42 +301,54 @@ async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Для личных чатов всегда возвращаем True
     if update.effective_chat.type == 'private':
-        logger.info(f"Пользователь {user_id} в личном чате {chat_id}, права администратора: True")
+        logger.debug("Пользователь %s в личном чате %s, права администратора: True", user_id, chat_id)
         return True
     
     # Для групповых чатов проверяем, является ли пользователь администратором
     try:
         chat_member = await context.bot.get_chat_member(chat_id, user_id)
-        is_admin_result = chat_member.status in ['creator', 'administrator']
-        logger.info(f"Пользователь {user_id} в чате {chat_id}, статус: {chat_member.status}, права администратора: {is_admin_result}")
+        is_admin_result = chat_member.status in _ADMIN_STATUSES
+        logger.debug("Пользователь %s в чате %s, статус: %s, права администратора: %s", user_id, chat_id, chat_member.status, is_admin_result)
         return is_admin_result
     except Exception as e:
-        logger.error(f"Ошибка при проверке прав администратора для пользователя {user_id} в чате {chat_id}: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Ошибка при проверке прав администратора для пользователя %s в чате %s: %s", user_id, chat_id, e)
         return False
 
 # Функция для проверки прав бота в группе
+# Результат кэшируется на PERMS_CACHE_TTL секунд, чтобы не обращаться к API на каждое сообщение
 async def check_bot_permissions(context: ContextTypes.DEFAULT_TYPE, chat_id):
+    now = time.monotonic()
+    cached = _PERMS_CACHE.get(chat_id)
+    if cached is not None and now - cached[0] < PERMS_CACHE_TTL:
+        return cached[1], cached[2]
+    
     try:
         bot_id = context.bot.id
         bot_member = await context.bot.get_chat_member(chat_id, bot_id)
         
-        logger.info(f"Права бота в чате {chat_id}: статус={bot_member.status}, can_delete_messages={getattr(bot_member, 'can_delete_messages', False)}")
+        logger.debug("Права бота в чате %s: статус=%s, can_delete_messages=%s", chat_id, bot_member.status, getattr(bot_member, 'can_delete_messages', False))
         
-        if bot_member.status not in ['administrator', 'creator']:
-            logger.warning(f"Бот не является администратором в чате {chat_id}")
-            return False, "Бот не является администратором в этом чате"
-        
-        if not getattr(bot_member, 'can_delete_messages', False):
-            logger.warning(f"У бота нет прав на удаление сообщений в чате {chat_id}")
-            return False, "У бота нет прав на удаление сообщений"
+        if bot_member.status not in _ADMIN_STATUSES:
+            logger.warning("Бот не является администратором в чате %s", chat_id)
+            result = (False, "Бот не является администратором в этом чате")
+        elif not getattr(bot_member, 'can_delete_messages', False):
+            logger.warning("У бота нет прав на удаление сообщений в чате %s", chat_id)
+            result = (False, "У бота нет прав на удаление сообщений")
+        else:
+            result = (True, "Бот имеет все необходимые права")
         
-        return True, "Бот имеет все необходимые права"
+        _PERMS_CACHE[chat_id] = (now, *result)
+        return result
     except Exception as e:
-        logger.error(f"Ошибка при проверке прав бота в чате {chat_id}: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Ошибка при проверке прав бота в чате %s: %s", chat_id, e)
         return False, f"Ошибка при проверке прав бота: {str(e)}"
 
+# Обработчик изменения статуса бота в чате: сбрасываем кэш прав
+async def bot_member_updated(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    _PERMS_CACHE.pop(chat_id, None)
+    logger.info(f"Статус бота в чате {chat_id} изменен, кэш прав сброшен")
+
 # Обработчик команды /start
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
@@ -207,15 +439,19 @@ async def add_word(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     word = context.args[0].lower()
     stopwords = await load_stopwords(chat_id)
+    if stopwords is None:
+        await update.message.reply_text('Не удалось загрузить список стоп-слов, попробуйте позже.')
+        return
     
     # Проверяем, есть ли уже такое слово в списке
     if word in stopwords:
         await update.message.reply_text(f'Слово "{word}" уже есть в списке стоп-слов.')
         return
     
-    # Добавляем слово в список и сохраняем
-    stopwords.append(word)
-    await save_stopwords(chat_id, stopwords)
+    # Добавляем слово в список
+    if not await add_stopword(chat_id, word):
+        await update.message.reply_text(f'Не удалось добавить слово "{word}" в список стоп-слов.')
+        return
     await update.message.reply_text(f'Слово "{word}" добавлено в список стоп-слов.')
 
 # Обработчик команды /remove_word
@@ -236,15 +472,19 @@ async def remove_word(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     word = context.args[0].lower()
     stopwords = await load_stopwords(chat_id)
+    if stopwords is None:
+        await update.message.reply_text('Не удалось загрузить список стоп-слов, попробуйте позже.')
+        return
     
     # Проверяем, есть ли такое слово в списке
     if word not in stopwords:
         await update.message.reply_text(f'Слово "{word}" не найдено в списке стоп-слов.')
         return
     
-    # Удаляем слово из списка и сохраняем
-    stopwords.remove(word)
-    await save_stopwords(chat_id, stopwords)
+    # Удаляем слово из списка
+    if not await remove_stopword(chat_id, word):
+        await update.message.reply_text(f'Не удалось удалить слово "{word}" из списка стоп-слов.')
+        return
     await update.message.reply_text(f'Слово "{word}" удалено из списка стоп-слов.')
 
 # Обработчик команды /list_words
@@ -254,34 +494,35 @@ async def list_words(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"Команда /list_words от пользователя {user_id} в чате {chat_id}")
     
     stopwords = await load_stopwords(chat_id)
+    if stopwords is None:
+        await update.message.reply_text('Не удалось загрузить список стоп-слов, попробуйте позже.')
+        return
     
     if not stopwords:
         await update.message.reply_text('Список стоп-слов пуст.')
         return
     
     # Формируем сообщение со списком стоп-слов
-    words_list = '\n'.join([f'• {word}' for word in stopwords])
+    words_list = '\n'.join([f'• {word}' for word in sorted(stopwords)])
     await update.message.reply_text(f'Список стоп-слов для этого чата:\n{words_list}')
 
 # Функция для безопасного удаления сообщения с обработкой ошибок
 async def safe_delete_message(context, chat_id, message_id):
     try:
         await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-        logger.info(f"Сообщение {message_id} в чате {chat_id} успешно удалено")
+        logger.debug("Сообщение %s в чате %s успешно удалено", message_id, chat_id)
         return True
     except TelegramError as e:
         error_str = str(e)
         if "message to delete not found" in error_str.lower():
-            logger.warning(f"Сообщение {message_id} в чате {chat_id} не найдено для удаления (возможно, уже удалено)")
+            logger.warning("Сообщение %s в чате %s не найдено для удаления (возможно, уже удалено)", message_id, chat_id)
         elif "message can't be deleted" in error_str.lower():
-            logger.warning(f"Сообщение {message_id} в чате {chat_id} не может быть удалено")
+            logger.warning("Сообщение %s в чате %s не может быть удалено", message_id, chat_id)
         else:
-            logger.error(f"Ошибка при удалении сообщения {message_id} в чате {chat_id}: {e}")
-            logger.error(traceback.format_exc())
+            logger.exception("Ошибка при удалении сообщения %s в чате %s: %s", message_id, chat_id, e)
         return False
     except Exception as e:
-        logger.error(f"Неизвестная ошибка при удалении сообщения {message_id} в чате {chat_id}: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Неизвестная ошибка при удалении сообщения %s в чате %s: %s", message_id, chat_id, e)
         return False
 
 # Обработчик всех сообщений
@@ -290,97 +531,147 @@ async def check_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.text:
         return
     
+    # Не проверяем собственные сообщения бота
+    # (is_bot не подходит: его выставляют и сообщениям от имени канала или анонимного администратора)
+    if update.message.from_user and update.message.from_user.id == context.bot.id:
+        return
+    
+    # Не проверяем устаревшие сообщения (например, накопившиеся за время перезапуска)
+    if time.time() - update.message.date.timestamp() > MAX_MESSAGE_AGE:
+        return
+    
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
     message_id = update.message.message_id
     message_text = update.message.text
     
     # Проверяем, не обрабатывали ли мы уже это сообщение
-    message_key = f"{chat_id}_{message_id}"
+    message_key = (chat_id, message_id)
     if message_key in processed_messages:
-        logger.info(f"Сообщение {message_id} в чате {chat_id} уже было обработано, пропускаем")
+        logger.debug("Сообщение %s в чате %s уже было обработано, пропускаем", message_id, chat_id)
         return
     
     # Добавляем сообщение в кэш обработанных
-    processed_messages.add(message_key)
+    processed_messages[message_key] = None
     
     # Ограничиваем размер кэша
-    if len(processed_messages) > MAX_CACHE_SIZE:
-        # Удаляем старые записи
-        processed_messages.clear()
-        processed_messages.add(message_key)
+    while len(processed_messages) > MAX_CACHE_SIZE:
+        # Удаляем самую старую запись
+        processed_messages.popitem(last=False)
     
-    logger.info(f"Получено сообщение {message_id} от пользователя {user_id} в чате {chat_id}: {message_text[:20]}...")
+    logger.debug("Получено сообщение %s от пользователя %s в чате %s: %.20s...", message_id, user_id, chat_id, message_text)
     
     # Не проверяем сообщения от администраторов (опционально)
     # if await is_admin(update, context):
     #     logger.info(f"Пользователь {user_id} является администратором, пропускаем проверку")
     #     return
     
-    # Проверяем права бота в группе (только для групповых чатов)
-    if update.effective_chat.type != 'private':
-        has_permissions, message = await check_bot_permissions(context, chat_id)
-        if not has_permissions:
-            logger.warning(f"Бот не имеет необходимых прав в чате {chat_id}: {message}")
-            # Не отправляем сообщение об ошибке при каждом сообщении, чтобы не спамить
-            return
-    
     # Загружаем список стоп-слов для текущего чата
     stopwords = await load_stopwords(chat_id)
     
-    # Если список пуст, не проверяем сообщение
+    # Если список пуст или не удалось его загрузить, не проверяем сообщение
     if not stopwords:
-        logger.info(f"Список стоп-слов для чата {chat_id} пуст, пропускаем проверку")
+        logger.debug("Список стоп-слов для чата %s пуст, пропускаем проверку", chat_id)
         return
     
     # Проверяем, содержит ли сообщение стоп-слова
-    message_text_lower = message_text.lower()
-    for word in stopwords:
-        if word in message_text_lower:
-            logger.info(f"Обнаружено стоп-слово '{word}' в сообщении {message_id} от пользователя {user_id} в чате {chat_id}")
-            
-            # Небольшая задержка перед удалением для обеспечения доставки сообщения
-            time.sleep(0.5)
-            
-            # Если сообщение содержит стоп-слово, удаляем его
-            success = await safe_delete_message(context, chat_id, message_id)
-            
-            if success:
-                logger.info(f"Сообщение {message_id} со стоп-словом '{word}' от пользователя {user_id} в чате {chat_id} успешно удалено")
-                # Отправляем уведомление пользователю (опционально)
-                # await context.bot.send_message(
-                #     chat_id=update.effective_chat.id,
-                #     text=f"Сообщение от {update.message.from_user.first_name} было удалено, так как содержало стоп-слово."
-                # )
-            else:
-                logger.warning(f"Не удалось удалить сообщение {message_id} со стоп-словом '{word}' в чате {chat_id}")
-            
-            break
+    word = find_stopword(chat_id, stopwords, message_text)
+    if word is None:
+        return
+    
+    logger.info("Обнаружено стоп-слово '%s' в сообщении %s от пользователя %s в чате %s", word, message_id, user_id, chat_id)
+    
+    # Проверяем права бота в группе (только для групповых чатов)
+    # Делаем это только после нахождения стоп-слова, чтобы не обращаться к API на каждое сообщение
+    if update.effective_chat.type != 'private':
+        has_permissions, message = await check_bot_permissions(context, chat_id)
+        if not has_permissions:
+            logger.warning("Бот не имеет необходимых прав в чате %s: %s", chat_id, message)
+            # Не отправляем сообщение об ошибке при каждом сообщении, чтобы не спамить
+            return
+    
+    # Небольшая задержка перед удалением для обеспечения доставки сообщения
+    # (asyncio.sleep не блокирует цикл событий, а благодаря concurrent_updates
+    # другие обновления обрабатываются, пока это сообщение ждет удаления)
+    if DELETE_DELAY > 0:
+        await asyncio.sleep(DELETE_DELAY)
+    
+    # Если сообщение содержит стоп-слово, удаляем его
+    success = await safe_delete_message(context, chat_id, message_id)
+    
+    if success:
+        logger.info("Сообщение %s со стоп-словом '%s' от пользователя %s в чате %s успешно удалено", message_id, word, user_id, chat_id)
+        # Отправляем уведомление пользователю (опционально)
+        # await context.bot.send_message(
+        #     chat_id=update.effective_chat.id,
+        #     text=f"Сообщение от {update.message.from_user.first_name} было удалено, так как содержало стоп-слово."
+        # )
+    else:
+        logger.warning("Не удалось удалить сообщение %s со стоп-словом '%s' в чате %s", message_id, word, chat_id)
 
 # Функция для обработки ошибок
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
-    logger.error(f"Произошла ошибка: {context.error}")
-    logger.error(traceback.format_exc())
+    # Обработчик вызывается вне блока except, поэтому передаем исключение явно
+    logger.error("Произошла ошибка: %s", context.error, exc_info=context.error)
     
-    # Отправляем сообщение об ошибке (опционально)
+    # Отправляем сообщение об ошибке не чаще раза в ERROR_REPLY_INTERVAL секунд на чат,
+    # чтобы при перегрузке Telegram API (429) не усиливать поток запросов
     if update and isinstance(update, Update) and update.effective_chat:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=f"Произошла ошибка при обработке запроса: {context.error}"
-        )
+        chat_id = update.effective_chat.id
+        now = time.monotonic()
+        last_sent = _error_reply_times.get(chat_id)
+        if last_sent is not None and now - last_sent < ERROR_REPLY_INTERVAL:
+            return
+        _error_reply_times[chat_id] = now
+        
+        try:
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text=f"Произошла ошибка при обработке запроса: {context.error}"
+            )
+        except TelegramError as e:
+            logger.warning("Не удалось отправить сообщение об ошибке в чат %s: %s", chat_id, e)
 
 def main():
-    # Вставьте ваш токен здесь
-    TOKEN = "7339416015:AAFSDeUI_3cFsDtT-j_iwwaqooESx6VmNtE"
+    # Токен бота берется из переменной окружения BOT_TOKEN
+    TOKEN = os.environ.get('BOT_TOKEN')
+    if not TOKEN:
+        logger.error("Не задана переменная окружения BOT_TOKEN")
+        return
     
     logger.info("Запуск бота...")
     logger.info(f"Python версия: {sys.version}")
     logger.info(f"Рабочая директория: {os.getcwd()}")
-    logger.info(f"Директория для стоп-слов: {os.path.abspath(STOPWORDS_DIR)}")
+    logger.info(f"База стоп-слов: {os.path.abspath(DB_PATH)}")
     
     try:
-        # Создаем приложение с увеличенным таймаутом для PythonAnywhere
-        application = Application.builder().token(TOKEN).connect_timeout(30).read_timeout(30).build()
+        # Пул переиспользуемых соединений для исходящих запросов к Bot API
+        # (увеличенный таймаут для PythonAnywhere)
+        request = HTTPXRequest(
+            connection_pool_size=HTTP_POOL_SIZE,
+            connect_timeout=30,
+            read_timeout=30,
+            http_version=HTTP_VERSION,
+        )
+        # Отдельное соединение для getUpdates, чтобы long polling не занимал общий пул
+        get_updates_request = HTTPXRequest(
+            connect_timeout=30,
+            read_timeout=30,
+            http_version=HTTP_VERSION,
+        )
+        
+        # Создаем приложение
+        application = (
+            Application.builder()
+            .token(TOKEN)
+            .request(request)
+            .get_updates_request(get_updates_request)
+            .post_shutdown(post_shutdown)
+            # Обновления обрабатываются параллельно, чтобы задержка перед удалением
+            # одного сообщения не задерживала остальные
+            .concurrent_updates(True)
+            .build()
+        )
         
         # Добавляем обработчики команд
         application.add_handler(CommandHandler("start", start))
@@ -390,6 +681,9 @@ def main():
         application.add_handler(CommandHandler("list_words", list_words))
         application.add_handler(CommandHandler("check_permissions", check_permissions))
         
+        # Добавляем обработчик изменения статуса бота в чатах
+        application.add_handler(ChatMemberHandler(bot_member_updated, ChatMemberHandler.MY_CHAT_MEMBER))
+        
         # Добавляем обработчик всех сообщений
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, check_message))
         
@@ -397,12 +691,31 @@ def main():
         application.add_error_handler(error_handler)
         
         # Запускаем бота
+        # Обновления, накопившиеся за время простоя, пропускаем: удалять старые сообщения уже поздно
         logger.info("Бот запущен и готов к работе")
-        application.run_polling(allowed_updates=["message", "edited_message", "channel_post", "edited_channel_post"])
+        if WEBHOOK_URL:
+            # Режим webhook: Telegram сам доставляет обновления через обратный прокси
+            logger.info(f"Режим webhook: {WEBHOOK_URL}, порт {WEBHOOK_PORT}")
+            application.run_webhook(
+                listen="0.0.0.0",
+                port=WEBHOOK_PORT,
+                url_path=TOKEN,
+                webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{TOKEN}",
+                allowed_updates=ALLOWED_UPDATES,
+                drop_pending_updates=True,
+            )
+        else:
+            # Long polling: соединение удерживается до 50 секунд, обновления приходят сразу
+            application.run_polling(
+                poll_interval=0.0,
+                timeout=50,
+                bootstrap_retries=-1,
+                allowed_updates=ALLOWED_UPDATES,
+                drop_pending_updates=True,
+            )
         
     except Exception as e:
-        logger.error(f"Критическая ошибка при запуске бота: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception("Критическая ошибка при запуске бота: %s", e)
 
 if __name__ == '__main__':
     main()
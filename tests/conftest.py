@@ -0,0 +1,20 @@
+import importlib.util
+import os
+
+import pytest
+
+pytest.importorskip("telegram")
+
+BOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "any.py")
+
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    # При импорте модуль создает директорию стоп-слов и файл лога в текущей директории
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location("bot", BOT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module
+    if module._db is not None:
+        module._db.close()
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+CHAT_ID = -100
+BOT_ID = 42
+CHANNEL_BOT_ID = 136817688
+
+
+class FakeBot:
+    id = BOT_ID
+
+    def __init__(self):
+        self.deleted = []
+
+    async def get_chat_member(self, chat_id, user_id):
+        return SimpleNamespace(status="administrator", can_delete_messages=True)
+
+    async def delete_message(self, chat_id, message_id):
+        self.deleted.append((chat_id, message_id))
+
+
+@pytest.fixture
+def context(bot, monkeypatch):
+    monkeypatch.setattr(bot, "DELETE_DELAY", 0)
+    bot._STOPWORDS_CACHE[CHAT_ID] = frozenset({"spam"})
+    return SimpleNamespace(bot=FakeBot())
+
+
+def make_update(user_id, is_bot=False, age=0, message_id=1):
+    user = SimpleNamespace(id=user_id, is_bot=is_bot)
+    message = SimpleNamespace(
+        text="buy SPAM now",
+        message_id=message_id,
+        from_user=user,
+        date=datetime.now(timezone.utc) - timedelta(seconds=age),
+    )
+    return SimpleNamespace(
+        message=message,
+        effective_chat=SimpleNamespace(id=CHAT_ID, type="supergroup"),
+        effective_user=user,
+    )
+
+
+def test_deletes_stopword_message(bot, context):
+    asyncio.run(bot.check_message(make_update(user_id=7), context))
+    assert context.bot.deleted == [(CHAT_ID, 1)]
+
+
+def test_skips_own_message(bot, context):
+    asyncio.run(bot.check_message(make_update(user_id=BOT_ID, is_bot=True), context))
+    assert context.bot.deleted == []
+    assert (CHAT_ID, 1) not in bot.processed_messages
+
+
+def test_checks_messages_sent_as_channel(bot, context):
+    update = make_update(user_id=CHANNEL_BOT_ID, is_bot=True)
+    asyncio.run(bot.check_message(update, context))
+    assert context.bot.deleted == [(CHAT_ID, 1)]
+
+
+def test_skips_stale_message(bot, context):
+    update = make_update(user_id=7, age=bot.MAX_MESSAGE_AGE + 5)
+    asyncio.run(bot.check_message(update, context))
+    assert context.bot.deleted == []
+    assert (CHAT_ID, 1) not in bot.processed_messages
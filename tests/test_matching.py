@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+CHAT_ID = -100
+
+
+@pytest.fixture(params=["ahocorasick", "regex"])
+def backend(request, bot, monkeypatch):
+    if request.param == "ahocorasick":
+        pytest.importorskip("ahocorasick")
+    else:
+        monkeypatch.setattr(bot, "ahocorasick", None)
+    return request.param
+
+
+def find(bot, words, text):
+    bot._MATCHER_CACHE.clear()
+    return bot.find_stopword(CHAT_ID, frozenset(words), text)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Купите SPAM недорого", "spam"),
+    ("Это РеКлАмА", "реклама"),
+    ("обычное сообщение", None),
+])
+def test_mixed_case(bot, backend, text, expected):
+    assert find(bot, {"spam", "реклама"}, text) == expected
+
+
+def test_message_shorter_than_shortest_stopword(bot, backend):
+    assert find(bot, {"spam", "реклама"}, "spa") is None
+    assert find(bot, {"spam", "реклама"}, "SPAM") == "spam"
+
+
+@pytest.mark.parametrize("words, text, expected", [
+    ({"spam", "spammer"}, "you SPAMMER", "spammer"),
+    ({"am", "spammer"}, "spammer", "spammer"),
+    ({"spa", "pam"}, "spam", "spa"),
+    ({"b", "abab"}, "aaaaabb", "b"),
+])
+def test_leftmost_longest_match(bot, backend, words, text, expected):
+    assert find(bot, words, text) == expected
+
+
+def test_backends_agree(bot, monkeypatch):
+    ahocorasick = pytest.importorskip("ahocorasick")
+    rng = random.Random(0)
+    for _ in range(2000):
+        words = {"".join(rng.choice("abA") for _ in range(rng.randint(1, 4))).lower()
+                 for _ in range(rng.randint(1, 5))}
+        text = "".join(rng.choice("abAB") for _ in range(rng.randint(0, 10)))
+        monkeypatch.setattr(bot, "ahocorasick", ahocorasick)
+        automaton_result = find(bot, words, text)
+        monkeypatch.setattr(bot, "ahocorasick", None)
+        regex_result = find(bot, words, text)
+        assert automaton_result == regex_result, (words, text)
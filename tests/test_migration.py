@@ -0,0 +1,40 @@
+import json
+
+
+def test_migrate_skips_malformed_legacy_files(bot, tmp_path):
+    stopwords_dir = tmp_path / bot.STOPWORDS_DIR
+    (stopwords_dir / "stopwords_-100.json").write_text(
+        json.dumps({"stopwords": ["Spam", "реклама"]}), encoding="utf-8"
+    )
+    (stopwords_dir / "stopwords_-200.json").write_text("{broken", encoding="utf-8")
+    (stopwords_dir / "stopwords_-300.json").write_text(
+        json.dumps({"stopwords": ["ok", 42]}), encoding="utf-8"
+    )
+
+    conn = bot.get_db()
+
+    assert bot._db is conn
+    rows = conn.execute("SELECT chat_id, word FROM stopwords ORDER BY chat_id, word").fetchall()
+    assert rows == [(-100, "spam"), (-100, "реклама")]
+    assert (stopwords_dir / "stopwords_-100.json.migrated").exists()
+    assert (stopwords_dir / "stopwords_-200.json.invalid").exists()
+    assert (stopwords_dir / "stopwords_-300.json.invalid").exists()
+    assert not (stopwords_dir / "stopwords_-200.json").exists()
+
+
+def test_migrate_survives_failed_rename(bot, tmp_path, monkeypatch):
+    stopwords_dir = tmp_path / bot.STOPWORDS_DIR
+    (stopwords_dir / "stopwords_-100.json").write_text(
+        json.dumps({"stopwords": ["spam"]}), encoding="utf-8"
+    )
+
+    def failing_replace(src, dst):
+        raise PermissionError(13, "Permission denied", src)
+
+    monkeypatch.setattr(bot.os, "replace", failing_replace)
+
+    conn = bot.get_db()
+
+    assert bot._db is conn
+    assert conn.execute("SELECT chat_id, word FROM stopwords").fetchall() == [(-100, "spam")]
+    assert (stopwords_dir / "stopwords_-100.json").exists()
@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+CHAT_ID = -100
+
+
+class FakeBot:
+    id = 42
+
+    def __init__(self):
+        self.status = "administrator"
+        self.calls = 0
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls += 1
+        return SimpleNamespace(status=self.status, can_delete_messages=True)
+
+
+@pytest.fixture
+def clock(bot, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(bot, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def check(bot, context):
+    return asyncio.run(bot.check_bot_permissions(context, CHAT_ID))
+
+
+def test_permissions_cached_until_ttl_expires(bot, clock):
+    context = SimpleNamespace(bot=FakeBot())
+
+    assert check(bot, context) == (True, "Бот имеет все необходимые права")
+    clock[0] += bot.PERMS_CACHE_TTL - 1
+    context.bot.status = "member"
+    assert check(bot, context)[0] is True
+    assert context.bot.calls == 1
+
+    clock[0] += 1
+    assert check(bot, context)[0] is False
+    assert context.bot.calls == 2
+
+
+def test_my_chat_member_update_invalidates_cache(bot, clock):
+    context = SimpleNamespace(bot=FakeBot())
+    assert check(bot, context)[0] is True
+
+    context.bot.status = "member"
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=CHAT_ID))
+    asyncio.run(bot.bot_member_updated(update, context))
+
+    assert check(bot, context)[0] is False
+    assert context.bot.calls == 2